@@ -12,6 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import os
+from functools import lru_cache
+from typing import Dict
+
 import pynini
 from pynini.lib import pynutil
 
@@ -19,12 +24,66 @@ from nemo_text_processing.inverse_text_normalization.es.utils import get_abs_pat
 from nemo_text_processing.text_normalization.en.graph_utils import (
     NEMO_DIGIT,
     NEMO_SIGMA,
+    NEMO_WHITE_SPACE,
     GraphFst,
     convert_space,
     delete_extra_space,
     delete_space,
+    generator_main,
     insert_space,
 )
+from nemo_text_processing.utils.logging import logger
+
+CURRENCY_FILES = [
+    "data/money/currency_major_singular.tsv",
+    "data/money/currency_major_plural.tsv",
+    "data/money/currency_minor_singular.tsv",
+    "data/money/currency_minor_plural.tsv",
+]
+
+add_leading_zero_to_double_digit = ((NEMO_DIGIT + NEMO_DIGIT) | (pynutil.insert("0") + NEMO_DIGIT)).optimize()
+and_graph = pynini.string_map(["con", "y"]).optimize()
+# always use a comma in the decimal
+insert_fractional_prefix = pynutil.insert("morphosyntactic_features: \",\" fractional_part: \"")
+
+# compiled money graphs of this process, keyed by _get_cache_key()
+_MONEY_GRAPHS: Dict[str, 'pynini.FstLike'] = {}
+
+
+@lru_cache(maxsize=None)
+def _load_inverted(path: str) -> 'pynini.FstLike':
+    """
+    Loads a currency file and inverts it, so that repeated MoneyFst constructions parse each file only once.
+    The returned graph is shared between callers and must not be modified in place.
+    """
+    return pynini.invert(pynini.string_file(path)).optimize()
+
+
+def _get_connective_skip(connective: 'pynini.FstLike') -> 'pynini.FstLike':
+    """
+    Returns a transducer that reads whitespace followed by an optional connective word and emits a single space,
+        e.g. " con " -> " "
+
+    Args:
+        connective: acceptor of the connective words, e.g. "con"
+    """
+    graph = pynini.closure(NEMO_WHITE_SPACE, 1) + pynini.closure(connective + pynini.closure(NEMO_WHITE_SPACE), 0, 1)
+    return pynini.cross(graph, " ").optimize()
+
+
+def _get_cache_key(cardinal: GraphFst, decimal: GraphFst) -> str:
+    """
+    Returns a short fingerprint of everything the money grammar is built from: the sizes of the
+    cardinal and decimal sub-grammars and the modification times of the currency files.
+    """
+    fingerprint = [
+        str(cardinal.graph_no_exception.num_states()),
+        str(decimal.final_graph_wo_negative.num_states()),
+    ]
+    for file in CURRENCY_FILES:
+        stat = os.stat(get_abs_path(file))
+        fingerprint.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.md5("|".join(fingerprint).encode("utf-8")).hexdigest()[:16]
 
 
 class MoneyFst(GraphFst):
@@ -35,77 +94,100 @@ class MoneyFst(GraphFst):
     Args:
         cardinal: CardinalFst
         decimal: DecimalFst
+        cache_dir: path to a dir with .far grammar file. Set to None to avoid using cache.
+        overwrite_cache: set to True to overwrite .far files
     """
 
-    def __init__(self, cardinal: GraphFst, decimal: GraphFst):
+    def __init__(
+        self, cardinal: GraphFst, decimal: GraphFst, cache_dir: str = None, overwrite_cache: bool = False,
+    ):
         super().__init__(name="money", kind="classify")
-        # quantity, integer_part, fractional_part, currency
 
+        cache_key = _get_cache_key(cardinal, decimal)
+        if not overwrite_cache and cache_key in _MONEY_GRAPHS:
+            # hand out a copy so that callers modifying self.fst in place don't affect the cached graph
+            self.fst = _MONEY_GRAPHS[cache_key].copy()
+            return
+
+        far_file = None
+        if cache_dir is not None and cache_dir != "None":
+            os.makedirs(cache_dir, exist_ok=True)
+            far_file = os.path.join(cache_dir, f"es_itn_money_{cache_key}.far")
+        if not overwrite_cache and far_file and os.path.exists(far_file):
+            self.fst = pynini.Far(far_file, mode="r")["money"]
+            logger.info(f"MoneyFst.fst was restored from {far_file}.")
+        else:
+            self.fst = self.get_money_graph(cardinal, decimal)
+
+            if far_file:
+                generator_main(far_file, {"money": self.fst})
+        _MONEY_GRAPHS[cache_key] = self.fst.copy()
+
+    def get_money_graph(self, cardinal: GraphFst, decimal: GraphFst) -> 'pynini.FstLike':
+        """
+        Builds the money classification grammar from scratch
+
+        Args:
+            cardinal: CardinalFst
+            decimal: DecimalFst
+        """
+        # quantity, integer_part, fractional_part, currency
         cardinal_graph = cardinal.graph_no_exception
         graph_decimal_final = decimal.final_graph_wo_negative
 
-        unit_singular = pynini.string_file(get_abs_path("data/money/currency_major_singular.tsv"))
-        unit_singular = pynini.invert(unit_singular)
-        unit_plural = pynini.string_file(get_abs_path("data/money/currency_major_plural.tsv"))
-        unit_plural = pynini.invert(unit_plural)
+        unit_singular = _load_inverted(get_abs_path("data/money/currency_major_singular.tsv"))
+        unit_plural = _load_inverted(get_abs_path("data/money/currency_major_plural.tsv"))
 
-        unit_minor_singular = pynini.string_file(get_abs_path("data/money/currency_minor_singular.tsv"))
-        unit_minor_singular = pynini.invert(unit_minor_singular)
-        unit_minor_plural = pynini.string_file(get_abs_path("data/money/currency_minor_plural.tsv"))
-        unit_minor_plural = pynini.invert(unit_minor_plural)
+        unit_minor_singular = _load_inverted(get_abs_path("data/money/currency_minor_singular.tsv"))
+        unit_minor_plural = _load_inverted(get_abs_path("data/money/currency_minor_plural.tsv"))
+        unit_minor_any = pynini.union(unit_minor_singular, unit_minor_plural).optimize()
 
         graph_unit_singular = pynutil.insert("currency: \"") + convert_space(unit_singular) + pynutil.insert("\"")
         graph_unit_plural = pynutil.insert("currency: \"") + convert_space(unit_plural) + pynutil.insert("\"")
 
-        graph_unit_minor_singular = (
-            pynutil.insert("currency: \"") + convert_space(unit_minor_singular) + pynutil.insert("\"")
-        )
-        graph_unit_minor_plural = (
-            pynutil.insert("currency: \"") + convert_space(unit_minor_plural) + pynutil.insert("\"")
-        )
+        # minor units are never selected by number agreement, so singular and plural share one currency wrapper
+        graph_unit_minor = pynutil.insert("currency: \"") + convert_space(unit_minor_any) + pynutil.insert("\"")
+
+        # "un"/"una" take the singular currency form, all other cardinals the plural one
+        one_graph = pynini.string_map(["un", "una"]).optimize()
+        cardinal_non_one = ((NEMO_SIGMA - one_graph) @ cardinal_graph).optimize()
 
-        add_leading_zero_to_double_digit = (NEMO_DIGIT + NEMO_DIGIT) | (pynutil.insert("0") + NEMO_DIGIT)
+        # cents are bounded to 0-99, so composing with the two-digit padding first leaves only a small graph
+        cents_body = (cardinal_non_one @ add_leading_zero_to_double_digit).optimize()
 
         # twelve dollars (and) fifty cents, zero cents
         cents_standalone = (
-            pynutil.insert("morphosyntactic_features: \",\"")  # always use a comma in the decimal
-            + insert_space
-            + pynutil.insert("fractional_part: \"")
+            insert_fractional_prefix
+            # add_weight puts the (tropical) weight on a single leading epsilon arc, so every cents path is
+            # discounted once; the two branches have disjoint inputs and there are no equal paths to prune
             + pynini.union(
-                pynutil.add_weight(((NEMO_SIGMA - "un") @ cardinal_graph), -0.7) @ add_leading_zero_to_double_digit
-                + delete_space,
-                pynini.cross("un", "01") + delete_space,
+                pynutil.add_weight(cents_body, -0.7) + delete_space,
+                pynini.cross(one_graph, "01") + delete_space,
             )
             + pynutil.insert("\"")
         )
 
+        cents_with_unit = insert_space + cents_standalone + pynutil.delete(unit_minor_any)
         optional_cents_standalone = pynini.closure(
-            delete_space
-            + pynini.closure((pynutil.delete("con") | pynutil.delete('y')) + delete_space, 0, 1)
-            + insert_space
-            + cents_standalone
-            + pynutil.delete(pynini.union(unit_minor_singular, unit_minor_plural)),
-            0,
-            1,
-        )
+            delete_space + ((pynutil.delete(and_graph) + delete_space + cents_with_unit) | cents_with_unit), 0, 1,
+        ).optimize()
 
         # twelve dollars fifty, only after integer
         # setenta y cinco dólares con sesenta y tres~$75,63
+        cents_suffix = (
+            pynutil.add_weight(cardinal_graph @ add_leading_zero_to_double_digit, -0.7) + pynutil.insert("\"")
+        )
         optional_cents_suffix = pynini.closure(
-            delete_extra_space
-            + pynutil.insert("morphosyntactic_features: \",\"")  # always use a comma in the decimal
-            + insert_space
-            + pynutil.insert("fractional_part: \"")
-            + pynini.closure(pynutil.delete("con") + delete_space, 0, 1)
-            + pynutil.add_weight(cardinal_graph @ add_leading_zero_to_double_digit, -0.7)
-            + pynutil.insert("\""),
+            _get_connective_skip(pynini.accep("con"))
+            + insert_fractional_prefix
+            + cents_suffix,
             0,
             1,
-        )
+        ).optimize()
 
         graph_integer = (
             pynutil.insert("integer_part: \"")
-            + ((NEMO_SIGMA - "un" - "una") @ cardinal_graph)
+            + cardinal_non_one
             + pynutil.insert("\"")
             + delete_extra_space
             + graph_unit_plural
@@ -113,7 +195,7 @@ class MoneyFst(GraphFst):
         )
         graph_integer |= (
             pynutil.insert("integer_part: \"")
-            + (pynini.cross("un", "1") | pynini.cross("una", "1"))
+            + pynini.cross(one_graph, "1")
             + pynutil.insert("\"")
             + delete_extra_space
             + graph_unit_singular
@@ -121,11 +203,12 @@ class MoneyFst(GraphFst):
         )
 
         cents_only_int = pynutil.insert("integer_part: \"0\" ")
-        cents_only_units = graph_unit_minor_singular | graph_unit_minor_plural
-        cents_only_graph = cents_only_int + cents_standalone + pynini.accep(" ") + cents_only_units
+        cents_only_graph = cents_only_int + cents_standalone + pynini.accep(" ") + graph_unit_minor
 
         graph_decimal = (graph_decimal_final + delete_extra_space + graph_unit_plural) | cents_only_graph
         graph_decimal |= graph_decimal_final + pynutil.delete(" de") + delete_extra_space + graph_unit_plural
         final_graph = graph_integer | graph_decimal
         final_graph = self.add_tokens(final_graph)
-        self.fst = final_graph.optimize()
+        # no epsnormalize/synchronize before optimizing: the delete_space closures give the graph unbounded
+        # label delay, and neither operation finishes in reasonable time on it
+        return final_graph.optimize()
@@ -88,7 +88,9 @@ class ClassifyFst(GraphFst):
             date_graph = DateFst(cardinal).fst
             word_graph = WordFst().fst
             time_graph = TimeFst().fst
-            money_graph = MoneyFst(cardinal=cardinal, decimal=decimal).fst
+            money_graph = MoneyFst(
+                cardinal=cardinal, decimal=decimal, cache_dir=cache_dir, overwrite_cache=overwrite_cache
+            ).fst
             whitelist_graph = WhiteListFst(input_file=whitelist).fst
             punct_graph = PunctuationFst().fst
             electronic_graph = ElectronicFst().fst
@@ -125,7 +125,10 @@ class InverseNormalizer(Normalizer):
         self.tagger = ClassifyFst(
             cache_dir=cache_dir, whitelist=whitelist, overwrite_cache=overwrite_cache, input_case=input_case
         )
-        self.verbalizer = VerbalizeFinalFst()
+        if lang == 'es':
+            self.verbalizer = VerbalizeFinalFst(cache_dir=cache_dir, overwrite_cache=overwrite_cache)
+        else:
+            self.verbalizer = VerbalizeFinalFst()
         self.parser = TokenParser()
         self.lang = lang
         self.max_number_of_permutations_per_split = max_number_of_permutations_per_split